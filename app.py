@@ -1,4 +1,5 @@
 import streamlit as st
+from collections import deque
 from PIL import Image
 import utils
 import threading
@@ -152,6 +153,8 @@ def main():
         st.session_state.is_reading = False
     if 'is_paused' not in st.session_state:
         st.session_state.is_paused = False
+    if 'token_usage_log' not in st.session_state:
+        st.session_state.token_usage_log = deque(maxlen=100)
 
     # --- Header Centrado ---
     with st.container():
@@ -183,7 +186,7 @@ def main():
         with st.spinner("Creando una receta única para ti... 👨‍🍳"):
             try:
                 # 1. Generar la receta estructurada
-                recipe_data = utils.get_structured_recipe(image, meal_type)
+                recipe_data = utils.get_structured_recipe(image, meal_type, st.session_state.token_usage_log)
                 
                 if recipe_data:
                     # Guardar la receta en session_state
@@ -198,5 +201,27 @@ def main():
     elif submit_button and uploaded_file is None:
         st.warning("Por favor, sube una imagen primero.")
 
+    # Consumo de tokens de Gemini en esta sesión
+    usage_report = utils.get_token_usage_report(st.session_state.token_usage_log)
+    if usage_report["entries"]:
+        with st.expander("📊 Uso de tokens"):
+            per_recipe = usage_report["per_recipe"]
+            # Solo mostrar tokens en caché si el modelo llegó a reutilizar alguno
+            show_cached = usage_report["totals"]["cached_tokens"] > 0
+            usage_cols = st.columns(4 if show_cached else 3)
+            with usage_cols[0]:
+                st.metric("Entrada / receta", f"{per_recipe['input_tokens']:.0f}")
+            with usage_cols[1]:
+                st.metric("Salida / receta", f"{per_recipe['output_tokens']:.0f}")
+            with usage_cols[2]:
+                st.metric("Imagen / receta", f"{per_recipe['image_tokens']:.0f}")
+            if show_cached:
+                with usage_cols[3]:
+                    st.metric("En caché / receta", f"{per_recipe['cached_tokens']:.0f}")
+            st.caption(f"Recetas generadas: {usage_report['recipes']} · Tokens totales: {usage_report['totals']['total_tokens']}")
+            if usage_report["failed_calls"]:
+                st.caption(f"Llamadas fallidas: {usage_report['failed_calls']} · Tokens en fallos: {usage_report['failed_totals']['total_tokens']}")
+            st.dataframe(usage_report["entries"])
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -65,15 +65,13 @@ print("TAVILY_API_KEY:", os.getenv("TAVILY_API_KEY"))
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 tavily = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
 
-def get_structured_recipe(image, meal_type):
-    """
-    Genera una receta estructurada en formato JSON utilizando Gemini.
-    """
-    model = genai.GenerativeModel('gemini-1.5-flash')
-    
-    prompt = f"""
+# Prefijo estático del prompt de recetas (instrucciones + esquema JSON).
+# Se construye una sola vez; solo el tipo de comida cambia entre peticiones.
+# Nota: gemini-1.5-flash no aplica caché implícito y el prefijo no alcanza el
+# mínimo del caché explícito, así que estos tokens se cobran en cada llamada.
+RECIPE_PROMPT_PREFIX = """
     Eres un chef experto en IA. Analiza la imagen de los ingredientes proporcionada.
-    Tu tarea es crear una receta creativa y deliciosa que sea específicamente un "{meal_type}". Esta es una restricción estricta y obligatoria. La receta DEBE ser un "{meal_type}".
+    Tu tarea es crear una receta creativa y deliciosa del tipo de comida que se indica en cada petición. Esta es una restricción estricta y obligatoria.
     
     Sigue estas instrucciones estrictamente:
     1.  **Identifica Ingredientes:** Primero, lista TODOS los ingredientes que puedas identificar en la imagen.
@@ -81,7 +79,7 @@ def get_structured_recipe(image, meal_type):
     3.  **Instrucciones Detalladas:** Para la sección 'instructions', escribe cada paso de la manera más descriptiva y clara posible, como si se lo estuvieras explicando a un principiante. Incluye detalles sobre temperaturas, texturas, tiempos y consejos de preparación en cada paso.
     4.  **Formato de Salida:** Responde ÚNICAMENTE con un objeto JSON. No incluyas texto antes o después del JSON.
         El JSON debe tener la siguiente estructura exacta:
-        {{
+        {
           "recipe_name": "Nombre del Plato",
           "description": "Una descripción breve y apetitosa del plato.",
           "prep_time": "X minutes",
@@ -90,12 +88,12 @@ def get_structured_recipe(image, meal_type):
           "category": "Saludable",
           "difficulty": "Fácil",
           "detected_ingredients": [
-            {{ "name": "Ingrediente 1 detectado", "quantity": "Descripción de la cantidad vista" }},
-            {{ "name": "Ingrediente 2 detectado", "quantity": "Descripción de la cantidad vista" }}
+            { "name": "Ingrediente 1 detectado", "quantity": "Descripción de la cantidad vista" },
+            { "name": "Ingrediente 2 detectado", "quantity": "Descripción de la cantidad vista" }
           ],
           "recipe_ingredients": [
-            {{ "name": "Ingrediente A para la receta", "quantity": "Cantidad necesaria" }},
-            {{ "name": "Ingrediente B para la receta", "quantity": "Cantidad necesaria" }}
+            { "name": "Ingrediente A para la receta", "quantity": "Cantidad necesaria" },
+            { "name": "Ingrediente B para la receta", "quantity": "Cantidad necesaria" }
           ],
           "instructions": [
             "Paso 1 de la preparación, muy detallado.",
@@ -110,21 +108,112 @@ def get_structured_recipe(image, meal_type):
             "Beneficio nutricional 1.",
             "Beneficio nutricional 2."
           ]
-        }}
+        }
+    """
+
+RECIPE_MODEL_NAME = 'gemini-1.5-flash'
+
+# Modelo reutilizado entre peticiones
+recipe_model = None
+
+def get_recipe_model():
+    """
+    Devuelve el modelo de recetas, creándolo una sola vez.
+    El prefijo estático va como system_instruction. Con este modelo no hay
+    caché de prompt: el prefijo se factura como entrada normal en cada llamada.
+    """
+    global recipe_model
+    if recipe_model is None:
+        recipe_model = genai.GenerativeModel(RECIPE_MODEL_NAME, system_instruction=RECIPE_PROMPT_PREFIX)
+    return recipe_model
+
+def record_token_usage(response, usage_log):
+    """
+    Registra los tokens de entrada, salida, caché e imagen de una respuesta de Gemini.
+    Nunca interrumpe la petición: si los metadatos no tienen el formato esperado, devuelve None.
+    """
+    if usage_log is None:
+        return None
+
+    try:
+        usage = response.usage_metadata
+        image_tokens = None
+        for detail in getattr(usage, 'prompt_tokens_details', None) or []:
+            modality = getattr(detail, 'modality', None)
+            if 'IMAGE' in str(getattr(modality, 'name', modality)).upper():
+                image_tokens = (image_tokens or 0) + (getattr(detail, 'token_count', 0) or 0)
+
+        entry = {
+            "recipe_name": None,
+            "success": False,
+            "input_tokens": getattr(usage, 'prompt_token_count', 0) or 0,
+            "output_tokens": getattr(usage, 'candidates_token_count', 0) or 0,
+            "cached_tokens": getattr(usage, 'cached_content_token_count', 0) or 0,
+            "image_tokens": image_tokens,
+            "total_tokens": getattr(usage, 'total_token_count', 0) or 0,
+        }
+    except (AttributeError, TypeError, ValueError) as e:
+        print(f"Error al leer el uso de tokens: {e}")
+        return None
+
+    usage_log.append(entry)
+    return entry
+
+def get_token_usage_report(usage_log):
+    """
+    Resume el consumo de tokens registrado, con promedios por receta generada.
+    Las llamadas fallidas se reportan aparte y no cuentan como recetas.
     """
+    entries = list(usage_log or [])
+    token_keys = ("input_tokens", "output_tokens", "cached_tokens", "image_tokens", "total_tokens")
+
+    def sum_tokens(selected):
+        return {key: sum(entry[key] or 0 for entry in selected) for key in token_keys}
+
+    successful = [entry for entry in entries if entry["success"]]
+    failed = [entry for entry in entries if not entry["success"]]
+    recipes = len(successful)
+    totals = sum_tokens(successful)
+    return {
+        "recipes": recipes,
+        "failed_calls": len(failed),
+        "totals": totals,
+        "per_recipe": {key: (value / recipes if recipes else 0) for key, value in totals.items()},
+        "failed_totals": sum_tokens(failed),
+        "entries": entries,
+    }
+
+def get_structured_recipe(image, meal_type, usage_log=None):
+    """
+    Genera una receta estructurada en formato JSON utilizando Gemini.
+    Si se pasa usage_log, se añade el consumo de tokens de la llamada.
+    """
+    model = get_recipe_model()
+    
+    # Solo esta parte varía entre peticiones; el prefijo va en el system_instruction
+    prompt = f'Tu tarea es crear una receta creativa y deliciosa que sea específicamente un "{meal_type}". Esta es una restricción estricta y obligatoria. La receta DEBE ser un "{meal_type}".'
     
     response = model.generate_content([prompt, image])
+    usage_entry = record_token_usage(response, usage_log)
     
     try:
         # Limpiar la respuesta para asegurar que sea un JSON válido
         json_text = response.text.strip().replace("```json", "").replace("```", "")
         recipe_data = json.loads(json_text)
-        return recipe_data
     except (json.JSONDecodeError, IndexError) as e:
         print(f"Error al decodificar JSON: {e}")
         print(f"Respuesta recibida: {response.text}")
         return None
 
+    if not isinstance(recipe_data, dict):
+        print(f"La respuesta no es un objeto JSON: {response.text}")
+        return None
+
+    if usage_entry is not None:
+        usage_entry["success"] = True
+        usage_entry["recipe_name"] = recipe_data.get("recipe_name")
+    return recipe_data
+
 def get_recipe_image(recipe_name):
     """
     Busca una imagen para la receta usando Tavily.